@@ -8,5 +8,18 @@ study the impact of cyber-centric alternatives to operational capabilities.
 
 """
 
-__all__ = ['admin', 'attacker', 'data', 'item', 'monitor', 'network', 'software',
-           'util']
+import importlib
+
+__all__ = ['admin', 'attacker', 'data', 'experiment', 'kernel', 'monitor', 'network',
+           'results', 'software', 'util']
+
+
+def __getattr__(name):
+    # Submodules are only imported on first access, keeping worker startup fast
+    if name in __all__:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,12 +1,11 @@
 from __future__ import division
 
-import simpy
 from numpy import random
 
-from software import Vulnerability, VULNERABILITY_STATES
-from network import Network, Router, Server, Subnet, Sensor, Vulnerable
+from .software import Vulnerability, VULNERABILITY_STATES
+from .network import Network, Router, Server, Subnet, Sensor, Vulnerable
 
-from util import SimpyMixin
+from .util import SimpyMixin
 
 __all__ = ['NetworkAdministrator']
 
@@ -25,6 +24,8 @@ class NetworkAdministrator(SimpyMixin, object):
     :param alarm_scan: period for scanning alarm
     :param vul_per_upgrade: average number of vulnerabilities added in each uprade for poisson distribution
     :param id_vulnerability: probability administrator identifies vulnerability used in discovered attack
+    :param num_analysts: number of analysts triaging alarms concurrently
+    :param triage_time: time it takes an analyst to triage one alarm (in days)
 
     :type env: :class:`simpy.Environment`
     :type name: str
@@ -36,8 +37,11 @@ class NetworkAdministrator(SimpyMixin, object):
     :type alarm_type: float
     :type vul_per_upgrade: float
     :type id_vulnerability: float
+    :type num_analysts: int
+    :type triage_time: float
 
     :func monitor: monitor the network sensors
+    :func triage: the process an analyst follows to triage an alarm
     :func upgrade: upgrade (or add new applications) to networked systems
     :func patch: the process admins follow after patching period
     :func apply-patch:
@@ -48,7 +52,7 @@ class NetworkAdministrator(SimpyMixin, object):
 
     def __init__(self, name=None, network_items=None, vulnerabilities=None, patches=None,
                  patching_period=15., upgrade_period=30., alarm_scan=1/24./60., vul_per_upgrade=3,
-                 id_vulnerability=0.1, *args, **kwargs):
+                 id_vulnerability=0.1, num_analysts=1, triage_time=1/24., *args, **kwargs):
 
         super(NetworkAdministrator, self).__init__(*args, **kwargs)
 
@@ -61,12 +65,19 @@ class NetworkAdministrator(SimpyMixin, object):
         self.alarm_scan = alarm_scan
         self.vul_per_upgrade = vul_per_upgrade
         self.id_vulnerability = id_vulnerability
+        self.triage_time = triage_time
 
         self.num_patches_applied = 0
 
         self.alarms = {'new': self.filter_store(),
                        'old': self.filter_store()}
 
+        # Analysts triage real alarms before false ones
+        self.analysts = self.priority_resource(capacity=num_analysts)
+
+        # Alarm held by the monitor while it scans for more
+        self._scanning = []
+
         # Register sensors to its 'new' alarms store
         for network_item in self.network.all_items:
             if isinstance(network_item, Sensor):
@@ -81,6 +92,17 @@ class NetworkAdministrator(SimpyMixin, object):
     def __repr__(self):
         return "<{}>".format(self.name)
 
+    @property
+    def alarm_backlog(self):
+        """ Number of alarms raised but not yet triaged. """
+        return (len(self.alarms['new'].items) + len(self._scanning) +
+                len(self.analysts.queue) + self.analysts.count)
+
+    @property
+    def alarm_latencies(self):
+        """ Time between each triaged alarm being raised and being triaged. """
+        return [alarm['triaged'] - alarm['ts'] for alarm in self.alarms['old'].items]
+
     def patch(self):
         """
         The patching process the Network Administrators follow.
@@ -117,18 +139,60 @@ class NetworkAdministrator(SimpyMixin, object):
         """
         The alarm monitoring process the Network Administrators follow.
 
+        The first new alarm starts an alarm scan period, at the end of which all
+        pending alarms are pulled in one batch and handed to the analysts, real
+        alarms ahead of false ones, drawing whether each reported vulnerability
+        is identified for the whole batch at once.
+
         """
 
+        pending = self.alarms['new'].items
         while True:
             alarm = yield self.alarms['new'].get()
+            self._scanning = [alarm]
+            yield self.timeout(self.alarm_scan)
+
+            batch = sorted([alarm] + pending, key=self.triage_priority)
+            del pending[:]
+            self._scanning = []
+
+            num_draws = sum(len(alarm.get('vulnerabilities', [])) for alarm in batch)
+            identified = random.uniform(0, 1, size=num_draws) < self.id_vulnerability
+
+            offset = 0
+            for alarm in batch:
+                num_vulnerabilities = len(alarm.get('vulnerabilities', []))
+                self.process(self.triage(alarm, identified[offset:offset + num_vulnerabilities]))
+                offset += num_vulnerabilities
+
+    @staticmethod
+    def triage_priority(alarm):
+        """ Priority of an alarm for the analysts, real alarms (0) come before false ones (1). """
+        return 1 if alarm.get('system') is None else 0
+
+    def triage(self, alarm, identified):
+        """
+        The process an analyst follows to triage an alarm.
+
+        :param alarm: the alarm to triage
+        :param identified: whether each of the alarm's vulnerabilities gets identified
+
+        :type alarm: dict
+        :type identified: :class:`numpy.ndarray`
+
+        """
+
+        with self.analysts.request(priority=self.triage_priority(alarm)) as analyst:
+            yield analyst
+            yield self.timeout(self.triage_time)
 
-            # TODO: COMPLETE THE PROCESSING OF THE ALARMS
-            for vulnerability in alarm.get('vulnerabilities', []):
-                if random.uniform(0,1) < self.id_vulnerability and \
-                   vulnerability.zero_day:
-                    vulnerability.action.succeed()
+        # TODO: COMPLETE THE PROCESSING OF THE ALARMS
+        for vulnerability, is_identified in zip(alarm.get('vulnerabilities', []), identified):
+            if is_identified and vulnerability.zero_day:
+                vulnerability.action.succeed()
 
-            self.alarms['old'].put(alarm)
+        alarm['triaged'] = self.now
+        self.alarms['old'].put(alarm)
 
     def upgrade(self, item_type=None, time_to_upgrade=None):
         """
@@ -159,7 +223,9 @@ class NetworkAdministrator(SimpyMixin, object):
 
     def remove_vulnerability(self, vulnerability, item):
         """ Remove a given vulnerability from the systems in the admin's network. """
-        if vulnerability in item.vulnerabilities.items:
-            _ = yield item.vulnerabilities.get(filter=lambda v: v == vulnerability)
-        else:
-            _ = yield self.timeout(0)
+        # The vulnerability is known, so take it out directly rather than through a filtered get
+        try:
+            item.vulnerabilities.items.remove(vulnerability)
+        except ValueError:
+            pass
+        _ = yield self.timeout(0)
@@ -1,8 +1,9 @@
 from __future__ import division
 
-import simpy
 from numpy import random
 
+from .util import SimpyMixin
+
 __all__ = ['Attacker', 'Malware']
 
 
@@ -48,6 +49,7 @@ class Attacker(SimpyMixin, object):
     def scan(self):
         """ Scan for potential targets. """
         while True:
+            pass
             # Scan for a target
 
     def attack(self, target):
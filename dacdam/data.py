@@ -1,5 +1,7 @@
 from __future__ import division
 
+from .util import SimpyMixin
+
 __all__ = ['Datafile']
 
 
@@ -0,0 +1,511 @@
+"""
+Data-farming experiment driver.
+
+A sweep runs every design point x replication of a scenario as an
+independent job.  Jobs are held in a :class:`JobQueue` shared by any number
+of :class:`Worker` processes, which claim jobs under a lease and run them.
+Jobs whose worker crashes are handed out again once their lease expires, and
+a :class:`Coordinator` reports progress, throughput and stragglers.
+
+The :class:`SQLiteJobQueue` and the memory-mapped
+:class:`dacdam.results.ResultCube` rely on file locking and a shared page
+cache, so they are only safe on the local filesystem of a single node,
+where workers write their time series straight into the cube.  Workers on
+other nodes need a queue they can all reach; they send their time series back
+through it instead and :meth:`Experiment.collect` merges them into the cube.
+
+A scenario is a function, referenced as 'module:function', that builds the
+simulation in the given environment from the design point parameters and
+returns probes for the metrics recorded in the cube.  Each job seeds the
+random number generator itself, so its results only depend on the scenario,
+its parameters and its seed.
+
+"""
+from __future__ import division
+
+import io
+import os
+import json
+import time
+import sqlite3
+import importlib
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+import numpy
+from numpy import median, random
+
+from .results import INDEX_FILE, ResultCube, json_default
+from .util import new_environment
+
+__all__ = ['Job', 'LeaseLost', 'JobQueue', 'SQLiteJobQueue', 'Worker', 'Coordinator', 'Experiment']
+
+
+JOB_STATES = ['pending', 'running', 'done', 'failed']
+
+QUEUE_FILE = 'jobs.sqlite'
+
+
+Job = namedtuple('Job', ['id', 'scenario', 'parameters', 'seed', 'design_point', 'replication',
+                         'attempts'])
+
+
+class LeaseLost(Exception):
+    """ Raised when the lease a worker holds on a job was handed to another worker. """
+
+
+def load_scenario(scenario):
+    """ Return the scenario function referenced by a 'module:function' string. """
+    module_name, _, function_name = scenario.partition(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+class JobQueue(ABC):
+    """
+    Interface of the queues holding the jobs of a sweep.
+
+    :param lease: time (in seconds) a worker may hold a job before it is handed out again
+    :param max_attempts: number of times a job is tried before it is marked as failed
+
+    :type lease: float
+    :type max_attempts: int
+
+    """
+
+    def __init__(self, lease=600., max_attempts=3):
+        self.lease = lease
+        self.max_attempts = max_attempts
+
+    @abstractmethod
+    def submit(self, jobs):
+        """ Add jobs, given as (scenario, parameters, seed, design_point, replication) tuples. """
+
+    @abstractmethod
+    def claim(self, worker):
+        """ Lease the next available job to ``worker``, returns None if there is none. """
+
+    @abstractmethod
+    def renew(self, job, worker):
+        """ Extend the lease ``worker`` holds on ``job``, returns False if it lost the lease. """
+
+    @abstractmethod
+    def complete(self, job, worker, result=None):
+        """
+        Mark ``job`` as done, returns False if ``worker`` lost its lease on it.
+
+        :param result: time series of a job whose worker could not write into the cube
+        :type result: :class:`numpy.ndarray`
+
+        """
+
+    @abstractmethod
+    def fail(self, job, worker, error):
+        """ Release ``job`` after an error so it can be retried. """
+
+    @abstractmethod
+    def jobs(self):
+        """ List the status of every job as dicts. """
+
+    @abstractmethod
+    def results(self):
+        """ Yield the (design_point, replication, result) of the done jobs that sent back a result. """
+
+    @abstractmethod
+    def clear(self):
+        """ Remove every job. """
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Job queue kept in an SQLite database.
+
+    SQLite's file locking is unreliable on network filesystems such as NFS,
+    so the database must be on a local filesystem and the queue is only
+    shared by workers on the same node.
+
+    :param path: path of the database file
+
+    :type path: str
+
+    """
+
+    def __init__(self, path, *args, **kwargs):
+        super(SQLiteJobQueue, self).__init__(*args, **kwargs)
+        self.path = path
+
+        connection = self._connect()
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                scenario TEXT NOT NULL,
+                parameters TEXT NOT NULL,
+                seed INTEGER NOT NULL,
+                design_point INTEGER NOT NULL,
+                replication INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_expires REAL,
+                started REAL,
+                finished REAL,
+                error TEXT,
+                result BLOB,
+                UNIQUE (design_point, replication))""")
+        connection.close()
+
+    def __repr__(self):
+        return "<SQLiteJobQueue: {}>".format(self.path)
+
+    def _connect(self):
+        # Autocommit mode, transactions are opened explicitly when claiming jobs
+        return sqlite3.connect(self.path, timeout=60, isolation_level=None)
+
+    def _execute(self, query, arguments=()):
+        connection = self._connect()
+        try:
+            return connection.execute(query, arguments).rowcount
+        finally:
+            connection.close()
+
+    def submit(self, jobs):
+        connection = self._connect()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.executemany(
+                'INSERT INTO jobs (scenario, parameters, seed, design_point, replication) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(scenario, json.dumps(parameters, default=json_default), seed, design_point, replication)
+                 for scenario, parameters, seed, design_point, replication in jobs])
+            connection.execute('COMMIT')
+        finally:
+            connection.close()
+
+    def claim(self, worker):
+        connection = self._connect()
+        try:
+            # Lock the database so no other worker can claim the same job
+            connection.execute('BEGIN IMMEDIATE')
+            now = time.time()
+
+            # Jobs whose lease expired were held by a worker that crashed
+            connection.execute(
+                "UPDATE jobs SET status = 'failed', error = 'lease expired' "
+                "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+                (now, self.max_attempts))
+
+            row = connection.execute(
+                "SELECT id, scenario, parameters, seed, design_point, replication, attempts FROM jobs "
+                "WHERE status = 'pending' OR (status = 'running' AND lease_expires < ?) "
+                "ORDER BY id LIMIT 1", (now,)).fetchone()
+
+            if row is None:
+                connection.execute('COMMIT')
+                return None
+
+            connection.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                "lease_expires = ?, started = ? WHERE id = ?",
+                (worker, now + self.lease, now, row[0]))
+            connection.execute('COMMIT')
+        finally:
+            connection.close()
+
+        job_id, scenario, parameters, seed, design_point, replication, attempts = row
+        return Job(job_id, scenario, json.loads(parameters), seed, design_point, replication,
+                   attempts + 1)
+
+    def renew(self, job, worker):
+        return self._execute(
+            "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time() + self.lease, job.id, worker)) > 0
+
+    def complete(self, job, worker, result=None):
+        if result is not None:
+            buffer = io.BytesIO()
+            numpy.save(buffer, result)
+            result = buffer.getvalue()
+        return self._execute(
+            "UPDATE jobs SET status = 'done', finished = ?, error = NULL, result = ? "
+            "WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time(), result, job.id, worker)) > 0
+
+    def fail(self, job, worker, error):
+        status = 'pending' if job.attempts < self.max_attempts else 'failed'
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, lease_expires = NULL WHERE id = ? AND worker = ?",
+            (status, error, job.id, worker))
+
+    def jobs(self):
+        connection = self._connect()
+        connection.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in connection.execute(
+                'SELECT id, design_point, replication, seed, status, worker, attempts, started, '
+                'finished, error FROM jobs ORDER BY id')]
+        finally:
+            connection.close()
+
+    def results(self):
+        connection = self._connect()
+        try:
+            for design_point, replication, result in connection.execute(
+                    "SELECT design_point, replication, result FROM jobs "
+                    "WHERE status = 'done' AND result IS NOT NULL ORDER BY id"):
+                yield design_point, replication, numpy.load(io.BytesIO(result))
+        finally:
+            connection.close()
+
+    def clear(self):
+        self._execute('DELETE FROM jobs')
+
+
+class Worker(object):
+    """
+    Claims jobs from a queue and runs them until the queue is drained.
+
+    :param queue: queue to claim jobs from
+    :param cube: path of the result cube the jobs write into
+    :param name: name of the worker, defaults to host and process id
+    :param backend: simulation backend the jobs run on (see :func:`dacdam.util.new_environment`)
+    :param local: whether the worker runs on the node holding the cube and writes into it, otherwise
+                  it opens the cube read-only and sends the time series back through the queue
+
+    :type queue: :class:`dacdam.experiment.JobQueue`
+    :type cube: str
+    :type name: str
+    :type backend: str
+    :type local: bool
+
+    """
+
+    def __init__(self, queue, cube, name=None, backend='simpy', local=True):
+        self.queue = queue
+        self.cube = ResultCube(cube, mode='r+' if local else 'r')
+        if name is None:
+            import socket  # Only needed for the default name, keeps it off the worker's import path
+            name = '{}:{}'.format(socket.gethostname(), os.getpid())
+        self.name = name
+        self.backend = backend
+        self.local = local
+        self.num_jobs_done = 0
+        self.num_jobs_failed = 0
+        self.num_jobs_lost = 0
+
+    def __repr__(self):
+        return "<Worker: {}>".format(self.name)
+
+    def run(self, max_jobs=None):
+        """ Run jobs until the queue has none left or ``max_jobs`` have been run. """
+        while max_jobs is None or self.num_jobs_done + self.num_jobs_failed + self.num_jobs_lost < max_jobs:
+            job = self.queue.claim(self.name)
+            if job is None:
+                break
+            try:
+                result = self.run_job(job)
+            except LeaseLost:
+                # Another worker holds the job now, it is neither done nor failed here
+                self.num_jobs_lost += 1
+            except Exception as error:
+                self.queue.fail(job, self.name, '{}: {}'.format(type(error).__name__, error))
+                self.num_jobs_failed += 1
+            else:
+                if self.queue.complete(job, self.name, result):
+                    self.num_jobs_done += 1
+                else:
+                    self.num_jobs_lost += 1
+
+    def run_job(self, job):
+        """
+        Run the simulation of a job, recording its metrics in the cube or,
+        for a worker that is not local, returning them.
+
+        Raises :class:`LeaseLost` if the job was handed to another worker meanwhile.
+
+        """
+        random.seed(job.seed)
+        env = new_environment(self.backend)
+        probes = load_scenario(job.scenario)(env, **job.parameters)
+        result = None if self.local else numpy.zeros(self.cube.shape[2:], dtype=self.cube.data.dtype)
+        recording = env.process(self.cube.record(env, job.design_point, job.replication, probes, out=result))
+
+        # Run one time bin at a time to keep the lease alive during long runs
+        renewed = time.time()
+        for time_bin in range(1, self.cube.shape[2]):
+            env.run(until=time_bin * self.cube.bin_width)
+            if time.time() - renewed > self.queue.lease / 2:
+                if not self.queue.renew(job, self.name):
+                    raise LeaseLost('{} lost its lease on job {}'.format(self.name, job.id))
+                renewed = time.time()
+        env.run(until=recording)
+
+        if self.local:
+            self.cube.flush()
+        return result
+
+
+class Coordinator(object):
+    """
+    Reports on the progress of a sweep.
+
+    :param queue: queue holding the jobs of the sweep
+    :param straggler_factor: how many times the median job duration a job may run before it is a straggler
+
+    :type queue: :class:`dacdam.experiment.JobQueue`
+    :type straggler_factor: float
+
+    """
+
+    def __init__(self, queue, straggler_factor=3.):
+        self.queue = queue
+        self.straggler_factor = straggler_factor
+
+    def report(self):
+        """
+        Summarize the sweep: number of jobs in each state, throughput (jobs
+        done per second), jobs done per worker and the running jobs that take
+        much longer than usual.
+
+        """
+
+        now = time.time()
+        jobs = self.queue.jobs()
+        counts = dict((state, 0) for state in JOB_STATES)
+        for job in jobs:
+            counts[job['status']] += 1
+
+        done = [job for job in jobs if job['status'] == 'done']
+        durations = [job['finished'] - job['started'] for job in done]
+
+        throughput = 0.
+        if done:
+            elapsed = max(job['finished'] for job in done) - min(job['started'] for job in jobs
+                                                                  if job['started'] is not None)
+            throughput = len(done) / elapsed if elapsed > 0 else float('inf')
+
+        workers = {}
+        for job in done:
+            workers[job['worker']] = workers.get(job['worker'], 0) + 1
+
+        stragglers = []
+        if durations:
+            limit = self.straggler_factor * median(durations)
+            stragglers = [job for job in jobs
+                          if job['status'] == 'running' and now - job['started'] > limit]
+
+        return {'counts': counts,
+                'throughput': throughput,
+                'workers': workers,
+                'stragglers': stragglers}
+
+    def wait(self, poll=5.):
+        """ Block until no job is pending or running, returns the final report. """
+        while True:
+            report = self.report()
+            if report['counts']['pending'] == 0 and report['counts']['running'] == 0:
+                return report
+            time.sleep(poll)
+
+
+class Experiment(object):
+    """
+    A data-farming sweep of a scenario over a set of design points.
+
+    The sweep lives in a directory holding its result cube and, unless
+    another queue is given, the SQLite database of its jobs.
+
+    :param path: directory of the sweep
+    :param queue: queue holding the jobs of the sweep
+
+    :type path: str
+    :type queue: :class:`dacdam.experiment.JobQueue`
+
+    """
+
+    def __init__(self, path, queue=None):
+        self.path = path
+        self.queue = queue if queue is not None else SQLiteJobQueue(os.path.join(path, QUEUE_FILE))
+
+    def __repr__(self):
+        return "<Experiment: {}>".format(self.path)
+
+    @classmethod
+    def create(cls, path, scenario, parameters, replications, time_bins, metrics, bin_width=1.,
+               seed=0, queue=None, overwrite=False):
+        """
+        Create the result cube of a sweep and submit one job per design point
+        x replication, seeded with ``seed`` plus its position in the cube.
+
+        :param path: directory of the sweep
+        :param scenario: scenario function as a 'module:function' string
+        :param parameters: parameters of each design point
+        :param replications: number of replications per design point
+        :param time_bins: number of time bins recorded per replication
+        :param metrics: names of the metrics returned as probes by the scenario
+        :param bin_width: simulated time covered by each time bin (in days)
+        :param seed: seed of the first job
+        :param queue: queue to submit the jobs to
+        :param overwrite: whether to replace the cube and jobs of a sweep already in ``path``
+
+        :type path: str
+        :type scenario: str
+        :type parameters: list
+        :type replications: int
+        :type time_bins: int
+        :type metrics: list
+        :type bin_width: float
+        :type seed: int
+        :type queue: :class:`dacdam.experiment.JobQueue`
+        :type overwrite: bool
+
+        """
+
+        if not overwrite and (os.path.exists(os.path.join(path, INDEX_FILE)) or
+                              os.path.exists(os.path.join(path, QUEUE_FILE)) or
+                              (queue is not None and queue.jobs())):
+            raise ValueError("'{}' already holds a sweep, pass 'overwrite=True' to replace it.".format(path))
+
+        ResultCube.create(path, parameters, replications, time_bins, metrics, bin_width=bin_width,
+                          overwrite=overwrite)
+        experiment = cls(path, queue=queue)
+        experiment.queue.clear()
+        experiment.queue.submit([(scenario, design_parameters,
+                                  seed + design_point * replications + replication,
+                                  design_point, replication)
+                                 for design_point, design_parameters in enumerate(parameters)
+                                 for replication in range(replications)])
+        return experiment
+
+    @property
+    def cube(self):
+        return ResultCube(self.path)
+
+    def worker(self, name=None, backend='simpy', local=True):
+        return Worker(self.queue, self.path, name=name, backend=backend, local=local)
+
+    def collect(self):
+        """ Write the time series sent back through the queue into the cube, returns how many there were. """
+        cube = ResultCube(self.path, mode='r+')
+        num_results = 0
+        for design_point, replication, result in self.queue.results():
+            cube.write(design_point, replication, result)
+            num_results += 1
+        cube.flush()
+        return num_results
+
+    def coordinator(self, straggler_factor=3.):
+        return Coordinator(self.queue, straggler_factor=straggler_factor)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run jobs of a DACDAM sweep.')
+    parser.add_argument('path', help='directory of the sweep')
+    parser.add_argument('--backend', default='simpy', help="simulation backend, 'simpy' or 'kernel'")
+    parser.add_argument('--max-jobs', type=int, default=None, help='number of jobs to run before exiting')
+    parser.add_argument('--remote', action='store_true',
+                        help='send the results back through the queue instead of writing into the cube')
+    arguments = parser.parse_args()
+
+    worker = Experiment(arguments.path).worker(backend=arguments.backend, local=not arguments.remote)
+    worker.run(max_jobs=arguments.max_jobs)
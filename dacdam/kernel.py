@@ -0,0 +1,683 @@
+"""
+A lightweight discrete-event kernel implementing the subset of the SimPy API
+used by the DACDAM entities.
+
+Almost every DACDAM event is a plain timeout or a store put/get, so this
+kernel trades SimPy's generality (conditions, interrupts, preemption) for a
+binary-heap scheduler, slotted event objects, direct callback dispatch and
+reuse of the timeouts no process holds on to any more.  Entities built on
+:class:`dacdam.util.SimpyMixin` run unchanged on either backend; pick one
+per run with :func:`dacdam.util.new_environment`.
+
+>>> env = Environment()
+>>> log = []
+>>> def clock(name, tick):
+...     while True:
+...         log.append((name, env.now))
+...         yield env.timeout(tick)
+>>> _ = env.process(clock('fast', 0.5))
+>>> _ = env.process(clock('slow', 1))
+>>> env.run(until=2)
+>>> log
+[('fast', 0), ('slow', 0), ('fast', 0.5), ('slow', 1), ('fast', 1.0), ('fast', 1.5)]
+
+"""
+from __future__ import division
+
+from heapq import heappush, heappop
+from itertools import count
+
+try:
+    from sys import getrefcount
+except ImportError:  # Not CPython, leave the timeouts to the garbage collector
+    getrefcount = None
+
+__all__ = ['Environment', 'Event', 'Timeout', 'Process', 'Store', 'FilterStore',
+           'Container', 'Resource', 'PriorityResource']
+
+
+URGENT = 0
+NORMAL = 1
+
+PENDING = object()
+
+
+def _unreferenced_count():
+    # What getrefcount reports for an event only held by a local variable
+    event = object()
+    return getrefcount(event)
+
+
+UNREFERENCED = _unreferenced_count() if getrefcount is not None else None
+
+
+class EmptySchedule(Exception):
+    """ Raised by :meth:`Environment.step` when there are no events left. """
+
+
+class Event(object):
+    """
+    An event that may happen at some point in simulated time.
+
+    :param env: simulation environment
+
+    :type env: :class:`dacdam.kernel.Environment`
+
+    """
+
+    __slots__ = ('env', 'callbacks', '_value', '_ok', 'defused')
+
+    def __init__(self, env):
+        self.env = env
+        self.callbacks = []
+        self._value = PENDING
+        self._ok = True
+        self.defused = False
+
+    def __repr__(self):
+        return '<{} object at 0x{:x}>'.format(self.__class__.__name__, id(self))
+
+    @property
+    def triggered(self):
+        return self._value is not PENDING
+
+    @property
+    def processed(self):
+        return self.callbacks is None
+
+    @property
+    def ok(self):
+        return self._ok
+
+    @property
+    def value(self):
+        if self._value is PENDING:
+            raise AttributeError('Value of {} is not yet available'.format(self))
+        return self._value
+
+    def trigger(self, event):
+        """ Trigger this event with the state and value of another event. """
+        self._ok = event._ok
+        self._value = event._value
+        self.env.schedule(self)
+
+    def succeed(self, value=None):
+        """ Trigger the event successfully, handing ``value`` to its waiters. """
+        if self._value is not PENDING:
+            raise RuntimeError('{} has already been triggered'.format(self))
+        self._ok = True
+        self._value = value
+        self.env.schedule(self)
+        return self
+
+    def fail(self, exception):
+        """ Trigger the event as failed; waiting processes get ``exception`` thrown in. """
+        if self._value is not PENDING:
+            raise RuntimeError('{} has already been triggered'.format(self))
+        if not isinstance(exception, BaseException):
+            raise ValueError('{} is not an exception.'.format(exception))
+        self._ok = False
+        self._value = exception
+        self.env.schedule(self)
+        return self
+
+
+class Timeout(Event):
+    """
+    An event that is triggered after ``delay`` has elapsed.
+
+    """
+
+    __slots__ = ('delay',)
+
+    def __init__(self, env, delay, value=None):
+        if delay < 0:
+            raise ValueError('Negative delay {}'.format(delay))
+        self.env = env
+        self.callbacks = []
+        self._value = value
+        self._ok = True
+        self.defused = False
+        self.delay = delay
+        env.schedule(self, NORMAL, delay)
+
+
+class Process(Event):
+    """
+    Drives a generator through the events it yields; the process itself is
+    an event that is triggered when the generator returns.
+
+    :param env: simulation environment
+    :param generator: generator yielding :class:`dacdam.kernel.Event` objects
+
+    :type env: :class:`dacdam.kernel.Environment`
+    :type generator: generator
+
+    """
+
+    __slots__ = ('_generator', '_target', '_resume_cb')
+
+    def __init__(self, env, generator):
+        if not hasattr(generator, 'throw'):
+            raise ValueError('{} is not a generator.'.format(generator))
+        self.env = env
+        self.callbacks = []
+        self._value = PENDING
+        self._ok = True
+        self.defused = False
+        self._generator = generator
+        self._resume_cb = self._resume
+
+        # Start the process without allocating an initialization event
+        self._target = None
+        env._push(env.now, URGENT, self._resume_cb, None)
+
+    @property
+    def target(self):
+        return self._target
+
+    @property
+    def is_alive(self):
+        return self._value is PENDING
+
+    def _resume(self, event):
+        env = self.env
+        env.active_process = self
+        generator = self._generator
+
+        while True:
+            try:
+                if event is None:
+                    event = next(generator)
+                elif event._ok:
+                    event = generator.send(event._value)
+                else:
+                    event.defused = True
+                    event = generator.throw(event._value)
+            except StopIteration as stop:
+                event = None
+                self._ok = True
+                self._value = getattr(stop, 'value', None)
+                env.schedule(self)
+                break
+            except BaseException as exc:
+                event = None
+                self._ok = False
+                self._value = exc
+                env.schedule(self)
+                break
+
+            try:
+                callbacks = event.callbacks
+            except AttributeError:
+                error = RuntimeError('Invalid yield value "{}"'.format(event))
+                event = Event(env)
+                event._ok = False
+                event._value = error
+                continue
+
+            if callbacks is not None:
+                callbacks.append(self._resume_cb)
+                break
+            # The event was already processed, resume straight away
+
+        self._target = event
+        env.active_process = None
+
+
+class Environment(object):
+    """
+    Execution environment for a simulation driven by a binary-heap scheduler.
+
+    :param initial_time: simulated time at which the environment starts
+
+    :type initial_time: float
+
+    """
+
+    def __init__(self, initial_time=0):
+        self._now = initial_time
+        self._queue = []
+        self._eid = count()
+        self._timeouts = []
+        self.active_process = None
+
+    @property
+    def now(self):
+        return self._now
+
+    def schedule(self, event, priority=NORMAL, delay=0):
+        """ Schedule ``event`` to be processed after ``delay``. """
+        heappush(self._queue, (self._now + delay, priority, next(self._eid), event))
+
+    def _push(self, time, priority, callback, argument):
+        # Direct dispatch entry: call ``callback(argument)`` without an event
+        heappush(self._queue, (time, priority, next(self._eid), (callback, argument)))
+
+    def peek(self):
+        """ Time of the next scheduled event, or infinity if there is none. """
+        try:
+            return self._queue[0][0]
+        except IndexError:
+            return float('inf')
+
+    def event(self):
+        return Event(self)
+
+    def timeout(self, delay, value=None):
+        if not self._timeouts:
+            return Timeout(self, delay, value)
+        if delay < 0:
+            raise ValueError('Negative delay {}'.format(delay))
+
+        # Reuse a processed timeout nothing refers to, see :meth:`run`
+        timeout = self._timeouts.pop()
+        timeout.callbacks = []
+        timeout._value = value
+        timeout.delay = delay
+        heappush(self._queue, (self._now + delay, NORMAL, next(self._eid), timeout))
+        return timeout
+
+    def process(self, generator):
+        return Process(self, generator)
+
+    def step(self):
+        """ Process the next event. """
+        try:
+            self._now, _, _, event = heappop(self._queue)
+        except IndexError:
+            raise EmptySchedule()
+
+        if event.__class__ is tuple:
+            callback, argument = event
+            callback(argument)
+            return
+
+        callbacks, event.callbacks = event.callbacks, None
+        for callback in callbacks:
+            callback(event)
+
+        if not event._ok and not event.defused:
+            raise event._value
+
+    def run(self, until=None):
+        """
+        Run the simulation until there are no more events, until the given
+        time is reached or until the given event has been processed.
+
+        :param until: time or event at which to stop the simulation
+
+        :type until: float or :class:`dacdam.kernel.Event`
+
+        """
+
+        if until is None:
+            until = float('inf')
+        elif isinstance(until, Event):
+            while until.callbacks is not None:
+                try:
+                    self.step()
+                except EmptySchedule:
+                    raise RuntimeError('No scheduled events left but "until" event was not triggered')
+            return until.value if until._ok else None
+        elif until < self._now:
+            raise ValueError('until (={}) must be greater than the current simulation time'.format(until))
+
+        # Inlined copy of :meth:`step`, avoiding a method call per event
+        queue = self._queue
+        timeouts = self._timeouts
+        recycle = getrefcount is not None
+        while queue and queue[0][0] < until:
+            self._now, _, _, event = heappop(queue)
+
+            if event.__class__ is tuple:
+                event[0](event[1])
+                continue
+
+            callbacks, event.callbacks = event.callbacks, None
+            for callback in callbacks:
+                callback(event)
+
+            if not event._ok and not event.defused:
+                raise event._value
+
+            # A timeout only referenced by this loop can't be observed by any
+            # process, so it is kept for the next call to :meth:`timeout`
+            if recycle and event.__class__ is Timeout and getrefcount(event) == UNREFERENCED:
+                timeouts.append(event)
+
+        if until != float('inf'):
+            self._now = until
+
+
+## STORES, CONTAINERS AND RESOURCES
+#
+# As in SimPy, a new put (get) event first tries to trigger the queued puts
+# (gets), and the queued gets (puts) are only tried again once the put (get)
+# event is processed, so that waiting processes resume in the same order.
+
+class Put(Event):
+    __slots__ = ('resource', 'item')
+
+    def __init__(self, resource, item):
+        self.env = resource._env
+        self.callbacks = [resource._trigger_get]
+        self._value = PENDING
+        self._ok = True
+        self.defused = False
+        self.resource = resource
+        self.item = item
+        resource.put_queue.append(self)
+        resource._trigger_put(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cancel()
+
+    def cancel(self):
+        if self._value is PENDING:
+            self.resource.put_queue.remove(self)
+
+
+class Get(Event):
+    __slots__ = ('resource', 'filter', 'amount')
+
+    def __init__(self, resource, filter=None, amount=None):
+        self.env = resource._env
+        self.callbacks = [resource._trigger_put]
+        self._value = PENDING
+        self._ok = True
+        self.defused = False
+        self.resource = resource
+        self.filter = filter
+        self.amount = amount
+        resource.get_queue.append(self)
+        resource._trigger_get(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cancel()
+
+    def cancel(self):
+        if self._value is PENDING:
+            self.resource.get_queue.remove(self)
+
+
+class BaseResource(object):
+    """
+    Base of the shared resources, holding their queues of put and get events.
+
+    Subclasses implement ``_do_put`` and ``_do_get``, which trigger the event
+    if they can and return whether the following queued events should be tried.
+
+    :param env: simulation environment
+    :param capacity: capacity of the resource
+
+    :type env: :class:`dacdam.kernel.Environment`
+    :type capacity: float
+
+    """
+
+    def __init__(self, env, capacity):
+        if capacity <= 0:
+            raise ValueError('"capacity" must be > 0.')
+        self._env = env
+        self._capacity = capacity
+        self.put_queue = []
+        self.get_queue = []
+
+    @property
+    def capacity(self):
+        return self._capacity
+
+    def _trigger_put(self, get_event):
+        queue = self.put_queue
+        index = 0
+        while index < len(queue):
+            event = queue[index]
+            proceed = self._do_put(event)
+            if event._value is PENDING:
+                index += 1
+            else:
+                del queue[index]
+            if not proceed:
+                break
+
+    def _trigger_get(self, put_event):
+        queue = self.get_queue
+        index = 0
+        while index < len(queue):
+            event = queue[index]
+            proceed = self._do_get(event)
+            if event._value is PENDING:
+                index += 1
+            else:
+                del queue[index]
+            if not proceed:
+                break
+
+
+class Store(BaseResource):
+    """
+    Resource for sharing Python objects between processes, first in first out.
+
+    :param env: simulation environment
+    :param capacity: maximum number of items in the store
+
+    :type env: :class:`dacdam.kernel.Environment`
+    :type capacity: float
+
+    """
+
+    def __init__(self, env, capacity=float('inf')):
+        super(Store, self).__init__(env, capacity)
+        self.items = []
+
+    def put(self, item):
+        return Put(self, item)
+
+    def get(self):
+        return Get(self)
+
+    def _do_put(self, event):
+        if len(self.items) < self._capacity:
+            self.items.append(event.item)
+            event.succeed()
+
+    def _do_get(self, event):
+        if self.items:
+            event.succeed(self.items.pop(0))
+
+
+class FilterStore(Store):
+    """
+    A :class:`Store` whose ``get`` only returns items matching a filter.
+
+    Filters must only depend on the item.  A waiting get already failed to
+    match the items in the store when it was last tried, so once a put is
+    processed it is only tried again if one of the items put since matches.
+
+    """
+
+    def __init__(self, env, capacity=float('inf')):
+        super(FilterStore, self).__init__(env, capacity)
+        self._fresh = []
+
+    def get(self, filter=lambda item: True):
+        return Get(self, filter=filter)
+
+    def _do_put(self, event):
+        if len(self.items) < self._capacity:
+            self.items.append(event.item)
+            self._fresh.append(event.item)
+            event.succeed()
+
+    def _trigger_get(self, put_event):
+        fresh, self._fresh = self._fresh, []
+        queue = self.get_queue
+        # Without a put event, the pass was started by the get just queued
+        new = queue[-1] if put_event is None else None
+        if not fresh and new is None:
+            return
+
+        index = 0
+        while index < len(queue):
+            event = queue[index]
+            if event is new or any(map(event.filter, fresh)):
+                self._do_get(event)
+                if event._value is not PENDING:
+                    del queue[index]
+                    continue
+            index += 1
+
+    def _do_get(self, event):
+        match = event.filter
+        for item in self.items:
+            if match(item):
+                self.items.remove(item)
+                event.succeed(item)
+                break
+        return True
+
+
+class Container(BaseResource):
+    """
+    Resource containing up to ``capacity`` of a continuous or discrete matter.
+
+    :param env: simulation environment
+    :param capacity: maximum level of the container
+    :param init: initial level of the container
+
+    :type env: :class:`dacdam.kernel.Environment`
+    :type capacity: float
+    :type init: float
+
+    """
+
+    def __init__(self, env, capacity=float('inf'), init=0):
+        if init < 0 or init > capacity:
+            raise ValueError('"init" must be between 0 and "capacity".')
+        super(Container, self).__init__(env, capacity)
+        self._level = init
+
+    @property
+    def level(self):
+        return self._level
+
+    def put(self, amount):
+        if amount <= 0:
+            raise ValueError('amount(={}) must be > 0.'.format(amount))
+        return Put(self, amount)
+
+    def get(self, amount):
+        if amount <= 0:
+            raise ValueError('amount(={}) must be > 0.'.format(amount))
+        return Get(self, amount=amount)
+
+    def _do_put(self, event):
+        if self._capacity - self._level >= event.item:
+            self._level += event.item
+            event.succeed()
+            return True
+
+    def _do_get(self, event):
+        if self._level >= event.amount:
+            self._level -= event.amount
+            event.succeed()
+            return True
+
+
+class Request(Put):
+    """ Request to use a :class:`Resource`; release it by leaving the ``with`` block. """
+
+    __slots__ = ('priority', 'time', 'key')
+
+    def __init__(self, resource, priority=0):
+        self.priority = priority
+        self.time = resource._env.now
+        self.key = (priority, self.time)
+        super(Request, self).__init__(resource, None)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.cancel()
+        if self._value is not PENDING:
+            self.resource.release(self)
+
+
+class Release(Get):
+    __slots__ = ('request',)
+
+    def __init__(self, resource, request):
+        self.request = request
+        super(Release, self).__init__(resource)
+
+
+class Resource(BaseResource):
+    """
+    Resource with ``capacity`` usage slots requested by processes.
+
+    :param env: simulation environment
+    :param capacity: number of usage slots
+
+    :type env: :class:`dacdam.kernel.Environment`
+    :type capacity: int
+
+    """
+
+    def __init__(self, env, capacity=1):
+        super(Resource, self).__init__(env, capacity)
+        self.users = []
+
+    @property
+    def count(self):
+        return len(self.users)
+
+    @property
+    def queue(self):
+        return self.put_queue
+
+    def request(self):
+        return Request(self)
+
+    def release(self, request):
+        """ Release the usage slot held by ``request``; waiting requests are granted once processed. """
+        return Release(self, request)
+
+    def _do_put(self, event):
+        if len(self.users) < self._capacity:
+            self.users.append(event)
+            event.succeed()
+
+    def _do_get(self, event):
+        if event.request in self.users:
+            self.users.remove(event.request)
+        event.succeed()
+
+
+class PriorityResource(Resource):
+    """
+    A :class:`Resource` whose waiting requests are granted by ascending
+    ``priority`` and then by request time.
+
+    """
+
+    def __init__(self, env, capacity=1):
+        super(PriorityResource, self).__init__(env, capacity)
+        self.put_queue = SortedQueue()
+
+    def request(self, priority=0, preempt=True):
+        return Request(self, priority=priority)
+
+
+class SortedQueue(list):
+    """ Queue of requests kept sorted by key, first come first served among equal keys. """
+
+    def append(self, event):
+        index = len(self)
+        while index > 0 and self[index - 1].key > event.key:
+            index -= 1
+        self.insert(index, event)
@@ -1,10 +1,8 @@
 from __future__ import division
 
-import simpy
-from networkx import Graph
 from numpy import random
 
-from util import pluralize, snake_case, SimpyMixin
+from .util import pluralize, snake_case, SimpyMixin
 
 __all__ = ['Network', 'Router', 'Server', 'Subnet', 'Sensor']
 
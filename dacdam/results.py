@@ -0,0 +1,189 @@
+from __future__ import division
+
+import os
+import json
+
+from numpy.lib.format import open_memmap
+
+__all__ = ['ResultCube']
+
+
+CUBE_FILE = 'cube.npy'
+COMPLETED_FILE = 'completed.npy'
+INDEX_FILE = 'index.json'
+
+
+def json_default(value):
+    """ Convert NumPy scalars and arrays, e.g., parameters from a NumPy design, for :func:`json.dump`. """
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError("Object of type '{}' is not JSON serializable.".format(type(value).__name__))
+
+
+class ResultCube(object):
+    """
+    Memory-mapped store of the outputs of a data-farming sweep.
+
+    Results are kept in a NumPy array indexed by design point x replication x
+    time bin x metric and saved in a directory alongside a small JSON index of
+    the parameters of each design point.  Parallel workers on the node holding
+    the cube open it and write their replications in place, so nothing has to
+    be sent back to the parent process and the cube can be analysed
+    out-of-core.  Memory maps are not kept coherent across the nodes sharing a
+    network filesystem, so workers on other nodes must not write into it.
+
+    :param path: directory of a cube made with :meth:`ResultCube.create`
+    :param mode: 'r' to read the results, 'r+' to write into them
+
+    :type path: str
+    :type mode: str
+
+    >>> import tempfile
+    >>> directory = tempfile.TemporaryDirectory()
+    >>> path = os.path.join(directory.name, 'sweep')
+    >>> cube = ResultCube.create(path, parameters=[{'num_analysts': 1}, {'num_analysts': 2}],
+    ...                          replications=3, time_bins=4, metrics=['backlog', 'patches'])
+    >>> cube.shape
+    (2, 3, 4, 2)
+    >>> cube.write(1, 2, [[0, 1], [2, 3], [4, 5], [6, 7]])
+    >>> ResultCube(path).metric('patches')[1, 2].tolist()
+    [1.0, 3.0, 5.0, 7.0]
+    >>> int(ResultCube(path).completed.sum())
+    1
+    >>> directory.cleanup()
+
+    """
+
+    def __init__(self, path, mode='r'):
+        if mode not in ('r', 'r+'):
+            raise ValueError("'mode' must be 'r' or 'r+' not '{}'.".format(mode))
+
+        self.path = path
+        self.mode = mode
+
+        with open(os.path.join(path, INDEX_FILE)) as index_file:
+            index = json.load(index_file)
+
+        self.parameters = index['parameters']
+        self.metrics = index['metrics']
+        self.bin_width = index['bin_width']
+
+        self.data = open_memmap(os.path.join(path, CUBE_FILE), mode=mode)
+        self.completed = open_memmap(os.path.join(path, COMPLETED_FILE), mode=mode)
+
+    def __repr__(self):
+        return "<ResultCube: {} {}>".format(self.path, self.shape)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    @classmethod
+    def create(cls, path, parameters, replications, time_bins, metrics, bin_width=1., dtype='float64',
+               overwrite=False):
+        """
+        Preallocate an empty cube on disk and open it for writing.
+
+        :param path: directory to create the cube in
+        :param parameters: parameters of each design point
+        :param replications: number of replications per design point
+        :param time_bins: number of time bins recorded per replication
+        :param metrics: names of the metrics recorded in each time bin
+        :param bin_width: simulated time covered by each time bin (in days)
+        :param dtype: data type of the recorded values
+        :param overwrite: whether to replace a cube already in ``path``
+
+        :type path: str
+        :type parameters: list
+        :type replications: int
+        :type time_bins: int
+        :type metrics: list
+        :type bin_width: float
+        :type dtype: str
+        :type overwrite: bool
+
+        """
+
+        if os.path.exists(os.path.join(path, INDEX_FILE)) and not overwrite:
+            raise ValueError("'{}' already holds a result cube, pass 'overwrite=True' to replace it.".format(path))
+
+        # Fails on unserializable parameters before anything is written
+        index = json.dumps({'parameters': list(parameters),
+                            'metrics': list(metrics),
+                            'bin_width': bin_width}, indent=2, default=json_default)
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        shape = (len(parameters), replications, time_bins, len(metrics))
+
+        # Only the headers are written, the data pages are allocated lazily by the OS
+        data = open_memmap(os.path.join(path, CUBE_FILE), mode='w+', dtype=dtype, shape=shape)
+        completed = open_memmap(os.path.join(path, COMPLETED_FILE), mode='w+', dtype='bool', shape=shape[:2])
+        del data, completed
+
+        # The index marks the cube as created, so it is only moved into place once complete
+        temp_path = os.path.join(path, INDEX_FILE + '.tmp')
+        with open(temp_path, 'w') as index_file:
+            index_file.write(index)
+        os.replace(temp_path, os.path.join(path, INDEX_FILE))
+
+        return cls(path, mode='r+')
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def metric(self, name):
+        """ View of the values of one metric, indexed by design point x replication x time bin. """
+        return self.data[..., self.metrics.index(name)]
+
+    def write(self, design_point, replication, values):
+        """
+        Write the time series of one replication and mark it as completed.
+
+        :param design_point: index of the design point
+        :param replication: index of the replication
+        :param values: values indexed by time bin x metric
+
+        :type design_point: int
+        :type replication: int
+        :type values: array_like
+
+        """
+
+        self.data[design_point, replication] = values
+        self.completed[design_point, replication] = True
+
+    def record(self, env, design_point, replication, probes, out=None):
+        """
+        Process sampling ``probes`` into the cube at the end of each time bin,
+        marking the replication as completed after the last one.  Given an
+        ``out`` array, the samples are recorded in it instead and the cube is
+        left untouched.
+
+        :param env: simulation environment
+        :param design_point: index of the design point
+        :param replication: index of the replication
+        :param probes: callables returning the current value of each metric, keyed by metric name
+        :param out: array indexed by time bin x metric to record into
+
+        :type env: :class:`simpy.Environment`
+        :type design_point: int
+        :type replication: int
+        :type probes: dict
+        :type out: :class:`numpy.ndarray`
+
+        """
+
+        probes = [probes[name] for name in self.metrics]
+        row = self.data[design_point, replication] if out is None else out
+        for time_bin in range(row.shape[0]):
+            yield env.timeout(self.bin_width)
+            row[time_bin] = [probe() for probe in probes]
+        if out is None:
+            self.completed[design_point, replication] = True
+
+    def flush(self):
+        """ Write any changes to the cube back to disk. """
+        self.data.flush()
+        self.completed.flush()
@@ -1,9 +1,8 @@
 from __future__ import division
 
-import simpy
 from numpy import random
 
-from util import SimpyMixin
+from .util import SimpyMixin
 
 __all__ = ['VulnerabilityManager', 'Vulnerability', 'Patch', 'Service']
 
@@ -1,11 +1,18 @@
 from __future__ import division
 
 import re
-import logging
-import simpy
+import sys
+import importlib
 
-__all__ = ['snake_case', 'pluralize', 'SimpyMixin']
+from . import kernel
 
+__all__ = ['snake_case', 'pluralize', 'new_environment', 'SimpyMixin']
+
+
+# Simulation backends, i.e., modules providing the SimPy environment and resources API,
+# imported only when a run asks for them
+BACKENDS = {'simpy': 'simpy',
+            'kernel': '.kernel'}
 
 ABERRANT_PLURAL_MAP = {
     'appendix': 'appendices',
@@ -110,23 +117,49 @@ def pluralize(singular):
 
 
 def clean_kwargs(obj, kwargs):
-    keys = obj.__init__.im_func.func_code.co_varnames
-    for key in kwargs:
+    keys = obj.__init__.__code__.co_varnames
+    for key in list(kwargs):
         if key not in keys:
             _ = kwargs.pop(key)
     return kwargs
 
 
+def new_environment(backend='simpy', *args, **kwargs):
+    """
+    Create the simulation environment for a run on the given backend.
+
+    :param backend: name of the backend, either 'simpy' or 'kernel' (see :mod:`dacdam.kernel`)
+
+    :type backend: str
+
+    """
+    if backend not in BACKENDS:
+        raise ValueError("'backend' must be one of {} not '{}'.".format(sorted(BACKENDS), backend))
+    return importlib.import_module(BACKENDS[backend], __package__).Environment(*args, **kwargs)
+
+
+def get_backend(env):
+    """ Return the backend module of a simulation environment, or None if it has none. """
+    if isinstance(env, kernel.Environment):
+        return kernel
+
+    # A SimPy environment can only exist if SimPy has already been imported
+    simpy = sys.modules.get('simpy')
+    if simpy is not None and isinstance(env, simpy.Environment):
+        return simpy
+    return None
+
+
 def set_env(self, args, kwargs):
     if 'env' not in kwargs or (len(args) > 0 and \
-        not isinstance(args[0], simpy.Environment)):
+        get_backend(args[0]) is None):
         kwargs['env'] = self.env
     return kwargs
 
 class SimpyMixin(object):
     def __init__(self, env, *args, **kwargs):
-        if not isinstance(env, simpy.Environment):
-            raise ValueError("'env' must be a <simpy.Environment> object not an object of type <{}>.".format(type(env).__name__))
+        if get_backend(env) is None:
+            raise ValueError("'env' must be a <simpy.Environment> or <dacdam.kernel.Environment> object not an object of type <{}>.".format(type(env).__name__))
 
         self.env = env
 
@@ -134,32 +167,41 @@ class SimpyMixin(object):
     def now(self):
         return self.env.now
 
+    @property
+    def backend(self):
+        return get_backend(self.env)
+
     def process(self, *args, **kwargs):
         return self.env.process(*args, **kwargs)
 
     def timeout(self, *args, **kwargs):
         return self.env.timeout(*args, **kwargs)
 
+    def event(self):
+        return self.env.event()
+
     def store(self, *args, **kwargs):
         kwargs = set_env(self, args, kwargs)
-        return simpy.Store(*args, **kwargs)
+        return self.backend.Store(*args, **kwargs)
 
     def filter_store(self, *args, **kwargs):
         kwargs = set_env(self, args, kwargs)
-        return simpy.FilterStore(*args, **kwargs)
+        return self.backend.FilterStore(*args, **kwargs)
 
     def container(self, *args, **kwargs):
         kwargs = set_env(self, args, kwargs)
-        return simpy.Container(*args, **kwargs)
+        return self.backend.Container(*args, **kwargs)
 
     def resource(self, *args, **kwargs):
         kwargs = set_env(self, args, kwargs)
-        return simpy.Resource(*args, **kwargs)
+        return self.backend.Resource(*args, **kwargs)
 
     def preemtive_resource(self, *args, **kwargs):
         kwargs = set_env(self, args, kwargs)
-        return simpy.PreemptiveResource(*args, **kwargs)
+        if not hasattr(self.backend, 'PreemptiveResource'):
+            raise NotImplementedError("Preemption is only supported by the 'simpy' backend.")
+        return self.backend.PreemptiveResource(*args, **kwargs)
 
     def priority_resource(self, *args, **kwargs):
         kwargs = set_env(self, args, kwargs)
-        return simpy.PriorityResource(*args, **kwargs)
+        return self.backend.PriorityResource(*args, **kwargs)
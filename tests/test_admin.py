@@ -0,0 +1,74 @@
+from __future__ import division
+
+import pytest
+
+from dacdam.admin import NetworkAdministrator
+from dacdam.network import Server
+from dacdam.software import Vulnerability
+from dacdam.util import new_environment
+
+
+@pytest.fixture(params=['simpy', 'kernel'])
+def env(request):
+    if request.param == 'simpy':
+        pytest.importorskip('simpy')
+    return new_environment(request.param)
+
+
+def administrator(env, alarms, **kwargs):
+    """ An administrator of a single server, receiving the given (time, name, real) alarms. """
+    server = Server(env=env, name='Server')
+    admin = NetworkAdministrator(env=env, network_items=[server], alarm_scan=0.1, **kwargs)
+
+    def sensor():
+        for ts, name, real in alarms:
+            yield env.timeout(ts - env.now)
+            alarm = {'ts': env.now, 'name': name, 'system': None}
+            if real:
+                alarm.update(system=server, vulnerabilities=[Vulnerability(env=env, affects='Server')])
+            admin.alarms['new'].put(alarm)
+
+    env.process(sensor())
+    return admin
+
+
+def triaged(admin):
+    return [(alarm['name'], alarm['triaged']) for alarm in admin.alarms['old'].items]
+
+
+def test_real_alarms_are_triaged_first(env):
+    admin = administrator(env, [(0, 'false_1', False), (0.01, 'false_2', False),
+                                (0.02, 'false_3', False), (0.03, 'real', True)], id_vulnerability=0)
+    env.run(until=5)
+    assert [name for name, _ in triaged(admin)] == ['real', 'false_1', 'false_2', 'false_3']
+
+
+def test_real_alarms_skip_the_queue(env):
+    admin = administrator(env, [(0, 'false_1', False), (0, 'false_2', False),
+                                (0, 'false_3', False), (0.2, 'real', True)], id_vulnerability=0,
+                          triage_time=0.5)
+    env.run(until=5)
+    assert [name for name, _ in triaged(admin)] == ['false_1', 'real', 'false_2', 'false_3']
+
+
+def test_alarms_are_batched_per_scan(env):
+    admin = administrator(env, [(0, 'a', False), (0.05, 'b', False), (0.2, 'c', False), (0.25, 'd', False)],
+                          triage_time=0)
+    env.run(until=1)
+    assert triaged(admin) == [('a', pytest.approx(0.1)), ('b', pytest.approx(0.1)),
+                              ('c', pytest.approx(0.3)), ('d', pytest.approx(0.3))]
+
+
+def test_alarm_backlog_and_latencies(env):
+    admin = administrator(env, [(0, 'a', False), (0, 'b', False), (0, 'c', False)], triage_time=0.5)
+    backlog = []
+
+    def probe():
+        for ts in [0.05, 0.2, 0.7, 1.2, 1.7]:
+            yield env.timeout(ts - env.now)
+            backlog.append(admin.alarm_backlog)
+
+    env.process(probe())
+    env.run(until=2)
+    assert backlog == [3, 3, 2, 1, 0]
+    assert admin.alarm_latencies == [pytest.approx(0.6), pytest.approx(1.1), pytest.approx(1.6)]
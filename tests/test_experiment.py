@@ -0,0 +1,202 @@
+from __future__ import division
+
+import sqlite3
+import time
+
+import numpy
+import pytest
+
+from dacdam.admin import NetworkAdministrator
+from dacdam.experiment import Experiment, JobQueue, LeaseLost, SQLiteJobQueue
+from dacdam.network import Sensor, Server
+
+SCENARIO = 'tests.test_experiment:scenario'
+
+
+def scenario(env, false_alarm_rate=0.5, crash=False):
+    """ A small network whose sensors raise false alarms. """
+    if crash:
+        raise RuntimeError('scenario crashed')
+    items = [Server(env=env, name='Server')] + \
+            [Sensor(env=env, name='Sensor_{}'.format(i), false_alarm_rate=false_alarm_rate) for i in range(3)]
+    admin = NetworkAdministrator(env=env, network_items=items)
+    return {'backlog': lambda: admin.alarm_backlog,
+            'triaged': lambda: len(admin.alarms['old'].items)}
+
+
+def create(path, parameters=None, replications=3, **kwargs):
+    parameters = [{'false_alarm_rate': 0.5}, {'false_alarm_rate': 0.1}] if parameters is None else parameters
+    return Experiment.create(str(path), SCENARIO, parameters, replications, time_bins=5,
+                             metrics=['backlog', 'triaged'], **kwargs)
+
+
+class LosingQueue(SQLiteJobQueue):
+    """ A queue on which every lease renewal fails, as if another worker took over the job. """
+
+    def renew(self, job, worker):
+        return False
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / 'jobs.sqlite'), lease=0.05, max_attempts=2)
+    queue.submit([(SCENARIO, {}, 7, 0, 0)])
+    return queue
+
+
+def test_run_sweep(tmp_path):
+    experiment = create(tmp_path)
+    worker = experiment.worker(name='worker')
+    worker.run()
+
+    assert worker.num_jobs_done == 6
+    assert experiment.cube.completed.all()
+    assert experiment.coordinator().report()['counts']['done'] == 6
+
+
+def test_create_refuses_existing_sweep(tmp_path):
+    create(tmp_path)
+    with pytest.raises(ValueError):
+        create(tmp_path)
+
+    experiment = create(tmp_path, overwrite=True)
+    assert len(experiment.queue.jobs()) == 6
+
+
+def test_job_queue_is_abstract():
+    with pytest.raises(TypeError):
+        JobQueue()
+
+
+def test_jobs_are_unique(queue):
+    with pytest.raises(sqlite3.IntegrityError):
+        queue.submit([(SCENARIO, {}, 8, 0, 0)])
+
+
+def test_lease_expiry(queue):
+    job = queue.claim('first')
+    assert job.attempts == 1
+    assert queue.claim('second') is None
+
+    time.sleep(0.1)
+    job = queue.claim('second')
+    assert job.attempts == 2
+    assert queue.jobs()[0]['worker'] == 'second'
+
+    # Out of attempts once the second lease expires too
+    time.sleep(0.1)
+    assert queue.claim('third') is None
+    assert queue.jobs()[0]['status'] == 'failed'
+
+
+def test_fail_retries_until_max_attempts(queue):
+    queue.fail(queue.claim('worker'), 'worker', 'error')
+    assert queue.jobs()[0]['status'] == 'pending'
+
+    queue.fail(queue.claim('worker'), 'worker', 'error')
+    job = queue.jobs()[0]
+    assert (job['status'], job['attempts'], job['error']) == ('failed', 2, 'error')
+    assert queue.claim('worker') is None
+
+
+def test_failed_jobs_counted_separately(tmp_path):
+    experiment = create(tmp_path, parameters=[{'crash': True}], replications=1)
+    worker = experiment.worker()
+    worker.run()
+
+    assert (worker.num_jobs_done, worker.num_jobs_failed) == (0, experiment.queue.max_attempts)
+    assert experiment.queue.jobs()[0]['status'] == 'failed'
+
+
+def test_crashed_worker_job_is_picked_up(tmp_path):
+    experiment = create(tmp_path, parameters=[{}], replications=1,
+                        queue=SQLiteJobQueue(str(tmp_path / 'leased.sqlite'), lease=0.05))
+
+    # A worker claims the job and dies without completing it
+    assert experiment.queue.claim('crashed') is not None
+    time.sleep(0.1)
+
+    worker = experiment.worker(name='survivor')
+    worker.run()
+
+    job = experiment.queue.jobs()[0]
+    assert (job['status'], job['worker'], job['attempts']) == ('done', 'survivor', 2)
+    assert experiment.cube.completed.all()
+
+
+def test_lost_lease_stops_job(tmp_path):
+    experiment = create(tmp_path, parameters=[{}], replications=1,
+                        queue=LosingQueue(str(tmp_path / 'leased.sqlite'), lease=0.))
+    worker = experiment.worker(name='worker')
+    worker.run(max_jobs=1)
+
+    assert (worker.num_jobs_done, worker.num_jobs_failed, worker.num_jobs_lost) == (0, 0, 1)
+    assert experiment.queue.jobs()[0]['status'] == 'running'
+    assert not experiment.cube.completed.any()
+
+
+def test_lease_lost_to_another_worker(tmp_path):
+    experiment = create(tmp_path, parameters=[{}], replications=1,
+                        queue=SQLiteJobQueue(str(tmp_path / 'leased.sqlite'), lease=0.))
+    worker = experiment.worker(name='worker')
+    job = experiment.queue.claim('worker')
+    time.sleep(0.01)
+    assert experiment.queue.claim('thief') is not None
+
+    with pytest.raises(LeaseLost):
+        worker.run_job(job)
+    assert not experiment.queue.complete(job, 'worker')
+    assert experiment.queue.jobs()[0]['worker'] == 'thief'
+
+
+def test_remote_workers_send_results_through_queue(tmp_path):
+    local = create(tmp_path / 'local')
+    local.worker().run()
+
+    remote = create(tmp_path / 'remote')
+    worker = remote.worker(local=False)
+    worker.run()
+    assert worker.num_jobs_done == 6
+    assert not remote.cube.completed.any()
+
+    assert remote.collect() == 6
+    assert remote.cube.completed.all()
+    assert numpy.array_equal(remote.cube.data, local.cube.data)
+
+
+def test_numpy_parameters(tmp_path):
+    experiment = create(tmp_path, parameters=[{'false_alarm_rate': numpy.float64(0.5)}], replications=1)
+    worker = experiment.worker()
+    worker.run()
+    assert worker.num_jobs_done == 1
+
+
+def test_jobs_are_deterministic(tmp_path):
+    experiment = create(tmp_path)
+    worker = experiment.worker()
+    job = experiment.queue.claim(worker.name)
+
+    worker.run_job(job)
+    first = numpy.array(experiment.cube[job.design_point, job.replication])
+    worker.cube.data[job.design_point, job.replication] = 0
+    worker.run_job(job)
+    assert numpy.array_equal(experiment.cube[job.design_point, job.replication], first)
+    assert first[:, 1].sum() > 0
+
+
+def test_straggler_detection(tmp_path):
+    experiment = create(tmp_path, parameters=[{}], replications=3)
+    queue = experiment.queue
+    now = time.time()
+
+    job = queue.claim('worker')
+    queue.complete(job, 'worker')
+    queue._execute('UPDATE jobs SET started = ?, finished = ? WHERE id = ?', (now - 11, now - 10, job.id))
+
+    slow, fast = queue.claim('slow'), queue.claim('fast')
+    queue._execute('UPDATE jobs SET started = ? WHERE id = ?', (now - 60, slow.id))
+
+    report = experiment.coordinator(straggler_factor=3.).report()
+    assert [job['worker'] for job in report['stragglers']] == ['slow']
+    assert report['counts'] == {'pending': 0, 'running': 2, 'done': 1, 'failed': 0}
+    assert report['workers'] == {'worker': 1}
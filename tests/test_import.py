@@ -0,0 +1,60 @@
+from __future__ import division
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['networkx', 'numpy', 'simpy']
+
+# Time dacdam may add on top of NumPy to a worker's start up, generous enough for a loaded
+# machine as it takes about 10 ms.  NumPy itself takes 100-150 ms, which no job can avoid.
+IMPORT_BUDGET = 0.05
+
+WORKER_DEPENDENCIES = 'import numpy.random, numpy.lib.format, sqlite3'
+
+
+def import_in_fresh_interpreter(statement, setup=''):
+    """
+    Run ``statement`` in a new interpreter after ``setup``, returns its duration and the heavy
+    modules loaded by both.
+
+    """
+    script = ('import json, sys, time\n'
+              '{}\n'
+              'start = time.perf_counter()\n'
+              '{}\n'
+              'elapsed = time.perf_counter() - start\n'
+              'print(json.dumps([elapsed, [name for name in {!r} if name in sys.modules]]))'
+              ).format(setup, statement, HEAVY_MODULES)
+    output = subprocess.check_output([sys.executable, '-c', script], cwd=ROOT)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def test_import_package_is_light():
+    _, loaded = import_in_fresh_interpreter('import dacdam')
+    assert loaded == []
+
+
+def test_worker_import_budget():
+    elapsed, loaded = import_in_fresh_interpreter('import dacdam.experiment, dacdam.admin',
+                                                  setup=WORKER_DEPENDENCIES)
+    assert loaded == ['numpy']
+    assert elapsed < IMPORT_BUDGET
+
+
+def test_kernel_backend_does_not_load_simpy():
+    _, loaded = import_in_fresh_interpreter(
+        "from dacdam.util import new_environment\n"
+        "new_environment('kernel')")
+    assert loaded == []
+
+
+@pytest.mark.parametrize('module', ['admin', 'network'])
+def test_entities_do_not_load_networkx_or_simpy(module):
+    _, loaded = import_in_fresh_interpreter('import dacdam.{}'.format(module))
+    assert loaded == ['numpy']
@@ -0,0 +1,209 @@
+from __future__ import division
+
+import numpy
+import pytest
+from numpy import random
+
+from dacdam import kernel
+from dacdam.admin import NetworkAdministrator
+from dacdam.network import Router, Sensor, Server, Subnet
+from dacdam.software import VulnerabilityManager
+from dacdam.util import new_environment
+
+simpy = pytest.importorskip('simpy')
+
+BACKENDS = ['simpy', 'kernel']
+
+
+def run_scenario(backend, seed, days=180):
+    """ A scaled down version of the notebook scenario, returns its outputs. """
+    random.seed(seed)
+    env = new_environment(backend)
+    manager = VulnerabilityManager(env=env, num_vulnerabilities=100)
+    items = [Router(env=env, name='Router_{:04d}'.format(i)) for i in range(5)] + \
+            [Server(env=env, name='Server_{:04d}'.format(i)) for i in range(6)] + \
+            [Subnet(env=env, name='Subnet_{:04d}'.format(i)) for i in range(3)] + \
+            [Sensor(env=env, name='Sensor_{:04d}'.format(i), false_alarm_rate=0.5) for i in range(8)]
+    admin = NetworkAdministrator(env=env, network_items=items, vulnerabilities=manager.vulnerabilities,
+                                 patches=manager.patches)
+    env.run(until=days)
+    return {'patches': len(manager.patches.items),
+            'patches_applied': admin.num_patches_applied,
+            'alarms': len(admin.alarms['old'].items),
+            'latency': numpy.mean(admin.alarm_latencies)}
+
+
+@pytest.fixture(scope='module')
+def outputs():
+    # Disjoint seeds, so the backends are compared as independent samples
+    return dict((backend, [run_scenario(backend, seed) for seed in range(offset, offset + 12)])
+                for backend, offset in zip(BACKENDS, [0, 1000]))
+
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_same_seed_same_trajectory(seed):
+    assert run_scenario('simpy', seed) == run_scenario('kernel', seed)
+
+
+@pytest.mark.parametrize('metric', ['patches', 'patches_applied', 'alarms', 'latency'])
+def test_statistically_equivalent(outputs, metric):
+    samples = [numpy.array([output[metric] for output in outputs[backend]]) for backend in BACKENDS]
+    # Welch's t statistic of the difference in means
+    error = numpy.sqrt(sum(sample.var(ddof=1) / len(sample) for sample in samples))
+    assert abs(samples[0].mean() - samples[1].mean()) <= 4 * error
+
+
+def trace(backend, scenario):
+    env = new_environment(backend)
+    log = []
+    scenario(env, simpy if backend == 'simpy' else kernel, log)
+    env.run(until=100)
+    return log
+
+
+def compare(scenario):
+    expected = trace('simpy', scenario)
+    assert expected
+    assert trace('kernel', scenario) == expected
+
+
+def test_held_timeout_keeps_its_value():
+    def scenario(env, backend, log):
+        def holder():
+            timeout = env.timeout(1, value='a-done')
+            yield env.timeout(2)
+            value = yield timeout
+            log.append((env.now, value))
+
+        def ticker():
+            while True:
+                yield env.timeout(1.5, value='b')
+
+        env.process(holder())
+        env.process(ticker())
+
+    compare(scenario)
+
+
+def test_process_return_value_and_failure():
+    def scenario(env, backend, log):
+        def child(value):
+            yield env.timeout(1)
+            if value is None:
+                raise KeyError('child')
+            return value
+
+        def parent():
+            log.append((env.now, (yield env.process(child(3)))))
+            try:
+                yield env.process(child(None))
+            except KeyError as error:
+                log.append((env.now, str(error)))
+
+        env.process(parent())
+
+    compare(scenario)
+
+
+def test_store_ordering():
+    def scenario(env, backend, log):
+        store = backend.Store(env, capacity=2)
+
+        def producer():
+            for item in range(5):
+                yield store.put(item)
+                log.append(('put', item, env.now))
+
+        def consumer(name, delay):
+            yield env.timeout(delay)
+            while True:
+                item = yield store.get()
+                log.append((name, item, env.now))
+                yield env.timeout(1)
+
+        env.process(consumer('a', 1))
+        env.process(consumer('b', 1))
+        env.process(producer())
+
+    compare(scenario)
+
+
+def test_filter_store_ordering():
+    def scenario(env, backend, log):
+        store = backend.FilterStore(env)
+
+        def consumer(name, parity):
+            while True:
+                item = yield store.get(lambda item: item % 2 == parity)
+                log.append((name, item, env.now))
+
+        def producer():
+            for item in [4, 1, 6, 3, 8]:
+                yield env.timeout(1)
+                yield store.put(item)
+
+        env.process(consumer('odd', 1))
+        env.process(consumer('even', 0))
+        env.process(producer())
+
+    compare(scenario)
+
+
+def test_priority_resource_ordering():
+    def scenario(env, backend, log):
+        resource = backend.PriorityResource(env, capacity=1)
+
+        def user(name, priority, delay):
+            yield env.timeout(delay)
+            with resource.request(priority=priority) as request:
+                yield request
+                log.append((name, env.now))
+                yield env.timeout(1)
+
+        for name, priority, delay in [('a', 5, 0), ('b', 3, 0.1), ('c', 1, 0.2), ('d', 3, 0.3)]:
+            env.process(user(name, priority, delay))
+
+    compare(scenario)
+
+
+def test_container_levels():
+    def scenario(env, backend, log):
+        container = backend.Container(env, capacity=10, init=5)
+
+        def taker():
+            for amount in [4, 4, 4]:
+                yield container.get(amount)
+                log.append(('get', amount, env.now, container.level))
+
+        def filler():
+            for amount in [3, 3, 3]:
+                yield env.timeout(1)
+                yield container.put(amount)
+                log.append(('put', amount, env.now, container.level))
+
+        env.process(taker())
+        env.process(filler())
+
+    compare(scenario)
+
+
+@pytest.mark.skipif(kernel.getrefcount is None, reason='timeouts are only reused on CPython')
+def test_only_released_timeouts_are_reused():
+    env = kernel.Environment()
+    held = []
+
+    def ticker():
+        while True:
+            yield env.timeout(1)
+
+    def holder():
+        for tick in range(5):
+            timeout = env.timeout(1.5, value=tick)
+            held.append(timeout)
+            yield timeout
+
+    env.process(ticker())
+    env.process(holder())
+    env.run(until=10)
+    assert [timeout.value for timeout in held] == list(range(5))
+    assert env._timeouts
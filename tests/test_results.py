@@ -0,0 +1,94 @@
+from __future__ import division
+
+import multiprocessing
+import os
+
+import numpy
+import pytest
+
+from dacdam.results import ResultCube, INDEX_FILE
+from dacdam.util import new_environment
+
+PARAMETERS = [{'num_analysts': 1}, {'num_analysts': 2}]
+
+
+def create(path, parameters=PARAMETERS, **kwargs):
+    return ResultCube.create(str(path), parameters, replications=2, time_bins=3,
+                             metrics=['now', 'double'], **kwargs)
+
+
+def write_replication(path, design_point, replication):
+    cube = ResultCube(path, mode='r+')
+    cube.write(design_point, replication, numpy.full((3, 2), 10 * design_point + replication))
+    cube.flush()
+
+
+def test_reopen_read_only(tmp_path):
+    create(tmp_path).write(1, 0, numpy.ones((3, 2)))
+
+    cube = ResultCube(str(tmp_path))
+    assert cube.parameters == PARAMETERS
+    assert cube[1, 0].tolist() == [[1, 1]] * 3
+    with pytest.raises(ValueError):
+        cube.write(0, 0, numpy.ones((3, 2)))
+    with pytest.raises(ValueError):
+        ResultCube(str(tmp_path), mode='w')
+
+
+def test_record_samples_each_time_bin(tmp_path):
+    cube = create(tmp_path, bin_width=2.)
+    env = new_environment('kernel')
+    env.process(cube.record(env, 0, 1, {'double': lambda: 2 * env.now, 'now': lambda: env.now}))
+
+    env.run(until=5)
+    assert not cube.completed[0, 1]
+    env.run(until=7)
+    assert cube[0, 1].tolist() == [[2, 4], [4, 8], [6, 12]]
+    assert cube.completed.tolist() == [[False, True], [False, False]]
+
+
+def test_metric(tmp_path):
+    cube = create(tmp_path)
+    cube.write(1, 1, [[0, 1], [2, 3], [4, 5]])
+    assert cube.metric('double').shape == (2, 2, 3)
+    assert cube.metric('double')[1, 1].tolist() == [1, 3, 5]
+    with pytest.raises(ValueError):
+        cube.metric('missing')
+
+
+def test_overwrite(tmp_path):
+    create(tmp_path).write(0, 0, numpy.ones((3, 2)))
+    with pytest.raises(ValueError):
+        create(tmp_path)
+
+    cube = create(tmp_path, parameters=PARAMETERS[:1], overwrite=True)
+    assert cube.shape == (1, 2, 3, 2)
+    assert not cube.data.any() and not cube.completed.any()
+
+
+def test_numpy_parameters(tmp_path):
+    parameters = [{'num_analysts': numpy.int64(2), 'triage_time': numpy.float32(0.5),
+                   'rates': numpy.arange(2)}]
+    create(tmp_path, parameters=parameters)
+    assert ResultCube(str(tmp_path)).parameters == [{'num_analysts': 2, 'triage_time': 0.5, 'rates': [0, 1]}]
+
+    # An unserializable parameter leaves the existing index untouched
+    with pytest.raises(TypeError):
+        create(tmp_path, parameters=[{'scenario': object()}], overwrite=True)
+    assert ResultCube(str(tmp_path)).parameters[0]['num_analysts'] == 2
+    assert sorted(os.listdir(str(tmp_path))) == ['completed.npy', 'cube.npy', INDEX_FILE]
+
+
+def test_processes_write_disjoint_replications(tmp_path):
+    create(tmp_path)
+    processes = [multiprocessing.Process(target=write_replication, args=(str(tmp_path), 1, replication))
+                 for replication in range(2)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    cube = ResultCube(str(tmp_path))
+    assert [process.exitcode for process in processes] == [0, 0]
+    assert cube[1, :, 0, 0].tolist() == [10, 11]
+    assert cube.completed.tolist() == [[False, False], [True, True]]